@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+import os
+import sys
+import time
+import resource
+import tempfile
+import argparse
+import subprocess
+from statistics import mean
+
+from scrapy import signals
+from scrapy.crawler import CrawlerProcess
+from scrapy.utils.project import get_project_settings
+
+from stocks.spiders.tagnifi import TagnifiSpider
+
+
+class LoadTest:
+    """
+    Runs TagnifiSpider against a local stub server and reports crawl throughput. The stub runs
+    in its own process, so it shares neither the GIL nor the memory usage with the crawler.
+    """
+    def __init__(self):
+
+        parser = argparse.ArgumentParser()
+        parser.add_argument('--tickers', type=int, default=100, help='Number of fake tickers to crawl.')
+        parser.add_argument('--limit', type=int, default=1, help='Periods requested per statement.')
+        parser.add_argument('--latency', type=float, default=0.05, help='Stub mean latency in seconds.')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Stub fraction of 503 responses.')
+        parser.add_argument('--throttle-rate', type=float, default=0.0, help='Stub fraction of 429 responses.')
+        parser.add_argument('--tags', type=int, default=50, help='Stub number of tags per period.')
+        parser.add_argument('--concurrency', type=int, default=8, help='CONCURRENT_REQUESTS for the crawl.')
+        parser.add_argument('--delay', type=float, default=0.0, help='DOWNLOAD_DELAY for the crawl.')
+        parser.add_argument('--backoff', type=float, default=0.5, help='RETRY_BACKOFF_BASE for the crawl.')
+        parser.add_argument('--cache', action='store_true', help='Keep the http cache enabled.')
+        parser.add_argument('--cache-dir', help='Http cache directory kept across runs, to measure a warm cache. '
+                                                'Implies --cache.')
+        parser.add_argument('--port', type=int, default=8000,
+                            help='Stub port. Cache entries are keyed by host, so keep it fixed across warm runs.')
+
+        self.args = parser.parse_args()
+        self.__started = {}
+        self.__finished = {}
+
+    # start_requests goes statement by statement, so a ticker is timed within each statement pass
+    @staticmethod
+    def _get_key(request):
+        return request.meta.get('company'), request.meta.get('statement')
+
+    def _request_scheduled(self, request, spider):
+        self.__started.setdefault(self._get_key(request), time.monotonic())
+
+    def _response_received(self, response, request, spider):
+        self.__finished[self._get_key(request)] = time.monotonic()
+
+    def _startStub(self):
+        stub = subprocess.Popen([sys.executable, '-m', 'stocks.stub', '--port', str(self.args.port),
+                                 '--latency', str(self.args.latency),
+                                 '--error-rate', str(self.args.error_rate),
+                                 '--throttle-rate', str(self.args.throttle_rate),
+                                 '--tags', str(self.args.tags)],
+                                cwd=os.path.dirname(os.path.abspath(__file__)), stdout=subprocess.PIPE, text=True)
+        # first line is "Serving on <url>"
+        line = stub.stdout.readline()
+        if not line.startswith('Serving on '):
+            stub.kill()
+            stub.wait()
+            raise RuntimeError(f"Stub server failed to start on port {self.args.port} (exit code {stub.returncode})")
+        return stub, line.split()[-1]
+
+    def run(self):
+        settings = get_project_settings()
+        workdir = tempfile.mkdtemp(prefix='stocks-loadtest-')
+        # spider settings (DOWNLOAD_DELAY) take precedence over project ones
+        settings.setdict({
+            'CONCURRENT_REQUESTS': self.args.concurrency,
+            'CONCURRENT_REQUESTS_PER_DOMAIN': self.args.concurrency,
+            'DOWNLOAD_DELAY': self.args.delay,
+            'RETRY_BACKOFF_BASE': self.args.backoff,
+            'HTTPCACHE_ENABLED': self.args.cache or bool(self.args.cache_dir),
+            'HTTPCACHE_DIR': os.path.abspath(self.args.cache_dir or os.path.join(workdir, 'httpcache')),
+            'TAGNIFI_CHECKPOINT_FILE': None,
+            'LOG_LEVEL': 'WARNING',
+        }, priority='cmdline')
+        # the spider writes its output to the current directory
+        os.chdir(workdir)
+
+        process = CrawlerProcess(settings)
+        crawler = process.create_crawler(TagnifiSpider)
+        crawler.signals.connect(self._request_scheduled, signal=signals.request_scheduled)
+        crawler.signals.connect(self._response_received, signal=signals.response_received)
+        companies = ','.join(f'T{i:05d}' for i in range(self.args.tickers))
+        stub, api_url = self._startStub()
+        try:
+            start = time.monotonic()
+            process.crawl(crawler, companies=companies, limit=self.args.limit, api_url=api_url)
+            process.start()
+            elapsed = time.monotonic() - start
+        finally:
+            stub.terminate()
+            stub.wait()
+
+        stats = crawler.stats.get_stats()
+        requests = stats.get('downloader/request_count', 0)
+        nbytes = stats.get('downloader/response_bytes', 0)
+        per_ticker = [self.__finished[key] - self.__started[key] for key in self.__finished if key in self.__started]
+        print(f"Output dir:          {workdir}")
+        print(f"Elapsed:             {elapsed:.2f} s")
+        print(f"Requests:            {requests} ({requests / elapsed:.2f} req/s)")
+        print(f"Response bytes:      {nbytes} ({nbytes / elapsed:.0f} B/s)")
+        print(f"Retries:             {stats.get('retry/count', 0)}")
+        print(f"Cache hits:          {stats.get('httpcache/hit', 0)}")
+        if per_ticker:
+            print(f"Time per statement:  mean {mean(per_ticker):.2f} s, max {max(per_ticker):.2f} s")
+        print(f"Max RSS:             {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MiB")
+
+
+if __name__ == '__main__':
+    loadtest = LoadTest()
+    loadtest.run()
@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 import re
 import json
+import shutil
+import hashlib
 import argparse
 from collections import defaultdict
 
@@ -8,127 +10,12 @@ from odf.opendocument import load
 from odf.table import TableRow, TableCell
 from odf.text import P
 
-from stocks.formula import evaluate
+from stocks.formula import evaluate, references
+from stocks.tags import TRANSLATION, DIVISORS
 
 _FILE_RE = re.compile(r"(\w+)-(\w+)-(\w+)")
 _MAX_NUM_ROWS = 200
-
-
-_TRANSLATION = {
-    'income_statement': {
-        'revenue': 3,
-        'costofrevenue': 7,
-        'sellinggeneraladministrative': 10,
-        'researchdevelopment': 11,
-        'depreciationdepletionamortizationexpense': 12,
-        'restructuringimpairmentchargesincomeopex': 13,
-        'otheroperatingexpenses': 16,
-        'interestexpense': 21,
-        'otherexpenseincome': 23,
-        'incomebeforeincometaxes': 24,
-        'incometaxes': 26,
-        # 'consolidatednetincomeloss': 27, to be computed
-        'noncontrollinginterestincome': 29,
-        'discontinuedoperations': 34,
-        'extraordinaryitems': 35,
-        'preferredstockdividendsdeclared': 38,
-        'netincomelossattributablecommonshareholders': 39,
-        'dilutedsharesoutstanding': 41,
-        'commonstockdividendsdeclared': 42,
-    },
-    'balance_sheet_statement': {
-        'cashequivalents': 47,
-        'shortterminvestments': 48,
-        'tradereceivables': 51,
-        'financingreceivables': 52,
-        'otherreceivables': 53,
-        'inventories': 55,
-        'prepaidexpensesothercurrentassets': 56,
-        'divestmentassetscurrent': 57,
-        'deferredtaxassetscurrent': 58,
-        'propertyplantequipment': 62,
-        'propertyplantequipmentnet': 64,
-        'goodwill': 65,
-        'intangibleassetsnet': 66,
-        'longterminvestments': 67,
-        'divestmentassetsnoncurrent': 68,
-        'deferredtaxassetsnoncurrent': 69,
-        'receivablesnoncurrent': 70,
-        'otherassets': 71,
-        'accountspayable': 74,
-        'accruedothercurrentliabilities': 77,
-        'debtcurrent': 79,
-        'taxespayablecurrent': 80,
-        'deferredliabilitiescurrent': 81,
-        'customeradvancesdepositscurrent': 82,
-        'divestmentliabilitiescurrent': 83,
-        'dividendspayable': 84,
-        'employeerelatedliabilitiescurrent': 85,
-        'longtermdebtcapitalleaseobligations': 90,
-        'deferredtaxesnoncurrent': 93,
-        'taxespayablenoncurrent': 94,
-        'divestmentliabilitiesnoncurrent': 95,
-        'noncontrollinginterest': 96,
-        'pensionotherpostretirementliabilities': 97,
-        'employeerelatedliabilitiesnoncurrent': 98,
-        'othernoncurrentliabilities': 99,
-        'preferredstock': 103,
-        'commonstock': 104,
-        'additionalpaidincapital': 105,
-        'retainedearningsdeficit': 106,
-        'treasurystock': 107,
-        'accumulatedothercomprehensiveincome': 108,
-        'commonstockclassasharesoutstanding': 114,
-    },
-    'cash_flow_statement': {
-        'depreciationdepletionamortization': 120,
-        'deferredincometaxestaxcredits': 121,
-        'sharebasedcompensation': 122,
-        'changedeferredrevenue': 123,
-        'gainlossonsale': 124,
-        'unrealizedgainloss': 125,
-        'pensionotherpostretirementbenefits': 126,
-        'changetaxespayable': 128,
-        'changeinventories': 129,
-        'changetradereceivables': 130,
-        'changeaccountspayable': 131,
-        'changeotheroperatingassetsliabilitiesnet': 132,
-        'restructuringimpairmentchargescashflow': 134,
-        'changecustomeradvancesdeposits': 135,
-        'provisiondoubtfulaccounts': 136,
-        'changefinancingreceivables': 137,
-        'changeotherreceivables': 138,
-        'extraordinaryitemscashflow': 139,
-        'otheroperatingactivities': 140,
-        'acquisitionsnet': 144,
-        'purchasepropertyplantequipment': 145,
-        'salepropertyplantequipment': 146,
-        'purchaseinvestments': 148,
-        'intangiblesnet': 149,
-        'salematurityinvestments': 150,
-        'otherinvestingactivities': 151,
-        'proceedsincentiveplans': 156,
-        'cashdividends': 157,
-        'dividendsnoncontrollinginterests': 158,
-        'noncontrollinginterestsfinancing': 159,
-        'equityissuances': 161,
-        'equityrepurchases': 162,
-        'longtermdebtrepayments': 164,
-        'longtermdebtissuances': 165,
-        'shorttermdebtissuancesrepayments': 167,
-        'otherfinancingactivities': 168,
-        'effectcurrencyexchangerate': 171,
-        'cashpaidincometaxes': 173,
-        'cashpaidinterest': 174,
-    },
-}
-
-
-_DIVISORS = defaultdict(lambda: 1000000.0)
-_DIVISORS.update({
-    'commonstockdividendsdeclared': 1.0,
-    'preferredstockdividendsdeclared': 1.0,
-})
+_FINGERPRINTS_SUFFIX = '.fingerprints.json'
 
 
 def _get_column_ord(col, colord=1):
@@ -224,7 +111,8 @@ class Cell:
 
     def getValue(self):
         value = self.__cell.getAttribute('value') or 0
-        if self.__cell.getAttribute("valuetype") in ("float", "currency"):
+        # formula results are stored as strings (see setValue), read them back as numbers when they are
+        if self.__cell.getAttribute("valuetype") in ("float", "currency") or self.getFormula():
             try:
                 value = float(value)
             except:
@@ -234,10 +122,6 @@ class Cell:
     def getFormula(self):
         return self.__cell.getAttribute('formula')
 
-    def evalFormula(self, filled_cells):
-        formula = self.getFormula()
-        return evaluate(formula, filled_cells)
-
 
 class Row:
 
@@ -289,6 +173,16 @@ class Row:
         raise ValueError
 
 
+def _normalize(values):
+    """
+    Evaluated formulas may give ints where the workbook gives back floats, hash them alike.
+
+    >>> _normalize({'K3': 4, 'K4': 4.0, 'K5': '#DIV/0!', 'K6': True})
+    {'K3': 4.0, 'K4': 4.0, 'K5': '#DIV/0!', 'K6': True}
+    """
+    return {key: float(value) if type(value) is int else value for key, value in values.items()}
+
+
 class keydefaultdict(defaultdict):
     def __missing__(self, key):
         if self.default_factory is None:
@@ -355,24 +249,138 @@ class Document:
 
 
 class Process:
-    def __init__(self):
+    def __init__(self, args=None):
 
         parser = argparse.ArgumentParser()
         parser.add_argument('spreadsheet', help='Update given spreadsheet')
         parser.add_argument('ifile', help='Process given input json (generated by spider)')
         parser.add_argument('column', help='Column where to start to add new data.')
+        parser.add_argument('--force', action='store_true', help='Update all columns, even the unchanged ones.')
 
-        self.args = parser.parse_args()
+        self.args = parser.parse_args(args)
         self.__filled_cells = None
 
+    def _loadFingerprints(self):
+        try:
+            with open(self.args.spreadsheet + _FINGERPRINTS_SUFFIX) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _saveFingerprints(self, fingerprints):
+        with open(self.args.spreadsheet + _FINGERPRINTS_SUFFIX, 'w') as f:
+            json.dump(fingerprints, f, indent=1, sort_keys=True)
+
+    def _fingerprint(self, sheet, column, header, values, formulas):
+        """
+        Hash of everything a column update depends on: the header, the tag values, the column
+        formulas and the current value of every cell those formulas read and we don't write.
+        The current value of the cells we write is hashed too, so the fingerprint stored after
+        an update no longer matches if the workbook is restored or edited afterwards.
+        """
+        inputs = {}
+        for formula in formulas.values():
+            for coord in references(formula):
+                col, row = Cell.tupleFromCoords(coord)
+                if col == column and (row in values or row in formulas):
+                    continue
+                try:
+                    inputs[coord] = self.__filled_cells[coord]
+                except ValueError:
+                    inputs[coord] = None
+        written = {}
+        for row in [1, *values, *formulas]:
+            written[row] = sheet.getCell(f'{column}{row}').getValue()
+        data = [header, sorted(values.items()), sorted(formulas.items()), sorted(_normalize(inputs).items()),
+                sorted(_normalize(written).items())]
+        return hashlib.sha1(json.dumps(data, default=str).encode()).hexdigest()
+
     def run(self):
+        """
+        Columns whose fingerprint did not change since the last run are skipped.
+
+        >>> import io, os, shutil, tempfile, contextlib
+        >>> from odf.opendocument import OpenDocumentSpreadsheet
+        >>> from odf.table import Table
+        >>> cwd = os.getcwd()
+        >>> os.chdir(tempfile.mkdtemp())
+        >>> ods = OpenDocumentSpreadsheet()
+        >>> table = Table(name='AAA')
+        >>> for row in range(1, 10):
+        ...     tablerow = TableRow()
+        ...     for col in 'ABCDEFGHIJKLM':
+        ...         if f'{col}{row}' in ('K5', 'L5'):
+        ...             prev = _incr_column(chr(ord(col) - 2))
+        ...             formula = f'of:=[.{col}3]-[.{col}7]+[.{prev}5]'
+        ...             tablerow.addElement(TableCell(formula=formula, valuetype='float', value=0))
+        ...         else:
+        ...             tablerow.addElement(TableCell())
+        ...     table.addElement(tablerow)
+        >>> ods.spreadsheet.addElement(table)
+        >>> ods.save('book.ods')
+        >>> shutil.copyfile('book.ods', 'blank.ods')
+        'blank.ods'
+        >>> def fundamental(quarter, revenue, cost):
+        ...     tags = [{'tag': 'Revenue', 'value': revenue * 1e6}, {'tag': 'CostOfRevenue', 'value': cost * 1e6}]
+        ...     return {'annual_period': False, 'fiscal_year': 2020, 'fiscal_quarter': quarter, 'end_period': '',
+        ...             'tags': tags}
+        >>> def dump(*fundamentals):
+        ...     json.dump({'fundamentals': list(fundamentals)}, open('AAA-income_statement-ttm.json', 'w'))
+        >>> def process(*args):
+        ...     out = io.StringIO()
+        ...     with contextlib.redirect_stdout(out):
+        ...         Process(['book.ods', 'AAA-income_statement-ttm.json', 'K', *args]).run()
+        ...     sheet = Document('book.ods').getSheet('AAA')
+        ...     lines = [line for line in out.getvalue().splitlines() if 'skipping' in line]
+        ...     cells = [sheet.getCell(cell).getValue() for cell in ('K1', 'K5', 'L1', 'L5')]
+        ...     print(*lines, out.getvalue().splitlines()[-1], cells)
+
+        Column L formulas read column K.
+
+        >>> dump(fundamental(3, 7, 2), fundamental(2, 5, 1))
+        >>> process()
+        Saved book.ods ['TTM 2020.II', 4.0, 'TTM 2020.III', 9.0]
+        >>> process()
+        Column K unchanged, skipping Column L unchanged, skipping Nothing changed in book.ods \
+['TTM 2020.II', 4.0, 'TTM 2020.III', 9.0]
+
+        Only the columns whose data changed are recomputed, reading the skipped ones from the workbook.
+
+        >>> dump(fundamental(3, 8, 2), fundamental(2, 5, 1))
+        >>> process()
+        Column K unchanged, skipping Saved book.ods ['TTM 2020.II', 4.0, 'TTM 2020.III', 10.0]
+        >>> process()
+        Column K unchanged, skipping Column L unchanged, skipping Nothing changed in book.ods \
+['TTM 2020.II', 4.0, 'TTM 2020.III', 10.0]
+
+        Restoring an older workbook keeps the sidecar fingerprints, but they no longer match its cells.
+
+        >>> shutil.copyfile('blank.ods', 'book.ods')
+        'book.ods'
+        >>> process()
+        Saved book.ods ['TTM 2020.II', 4.0, 'TTM 2020.III', 10.0]
+
+        So does a change in a cell the column formulas depend on, and the columns depending on it.
+
+        >>> doc = Document('book.ods')
+        >>> doc.getSheet('AAA').getCell('J5').setValue(2.0, 'float')
+        >>> doc.save()
+        >>> process()
+        Saved book.ods ['TTM 2020.II', 6.0, 'TTM 2020.III', 12.0]
+        >>> process('--force')
+        Saved book.ods ['TTM 2020.II', 6.0, 'TTM 2020.III', 12.0]
+        >>> os.chdir(cwd)
+        """
         company, statement, period_type = _FILE_RE.match(self.args.ifile).groups()
         doc = Document(self.args.spreadsheet)
-        doc.save(self.args.spreadsheet + '.back')
         sheet = doc.getSheet(company)
         self.__filled_cells = keydefaultdict(lambda key: sheet.getCell(key).getValue())
-        translations = _TRANSLATION[statement]
+        translations = TRANSLATION[statement]
         new_data = json.load(open(self.args.ifile))
+        fingerprints = self._loadFingerprints()
+        # each statement fills different rows of the same columns
+        sheet_fingerprints = fingerprints.setdefault(company, {}).setdefault(statement, {})
+        changed = False
         column = self.args.column
         for fundamental in new_data['fundamentals'][::-1]:
             if period_type == 'annual' and not fundamental['annual_period']:
@@ -381,27 +389,54 @@ class Process:
                 continue
 
             print(f"End period: {fundamental['end_period']}")
-            # update header
-            cell = sheet.getCell(f'{column}1')
+            header = None
             if period_type == 'annual':
-                cell.setValue(str(fundamental['fiscal_year']))
+                header = str(fundamental['fiscal_year'])
             elif period_type in ('quarter', 'ttm'):
                 quarter = fundamental['fiscal_quarter']
                 if quarter == 4:
-                    cell.setValue(str(fundamental['fiscal_year']))
+                    header = str(fundamental['fiscal_year'])
                 else:
-                    cell.setValue(f"TTM {fundamental['fiscal_year']}.{'I'*quarter}")
+                    header = f"TTM {fundamental['fiscal_year']}.{'I'*quarter}"
 
-            # update column
+            values = {}
+            names = {}
             for tag in fundamental['tags']:
                 tag['tag'] = tag['tag'].lower()
                 if tag['tag'] in translations:
-                    value = tag['value'] / _DIVISORS[tag['tag']]
+                    value = tag['value'] / DIVISORS[tag['tag']]
                     if value:
                         row = translations[tag['tag']]
-                        cell = sheet.getCell(f'{column}{row}')
-                        cell.setValue(value, 'float')
-                        print(f"Updated cell {column}{row} with value {value} ({tag['tag']})")
+                        values[row] = value
+                        names[row] = tag['tag']
+
+            # cells we write lose their formula
+            formulas = {}
+            for row in range(1, _MAX_NUM_ROWS + 1):
+                if row in values or (row == 1 and header is not None):
+                    continue
+                try:
+                    formula = sheet.getCell(f'{column}{row}').getFormula()
+                except ValueError:
+                    continue
+                if formula is not None:
+                    formulas[row] = formula
+
+            fingerprint = self._fingerprint(sheet, column, header, values, formulas)
+            if not self.args.force and sheet_fingerprints.get(column) == fingerprint:
+                print(f"Column {column} unchanged, skipping")
+                column = _incr_column(column)
+                continue
+
+            # update header
+            if header is not None:
+                sheet.getCell(f'{column}1').setValue(header)
+
+            # update column
+            for row, value in values.items():
+                cell = sheet.getCell(f'{column}{row}')
+                cell.setValue(value, 'float')
+                print(f"Updated cell {column}{row} with value {value} ({names[row]})")
 
             # update formulas
             for row in range(1, _MAX_NUM_ROWS + 1):
@@ -410,28 +445,28 @@ class Process:
                     self.__filled_cells[coord] = sheet.getCell(coord).getValue()
                 except ValueError:
                     pass
-            for row in range(1, _MAX_NUM_ROWS + 1):
+            for row, formula in formulas.items():
+                cell = sheet.getCell(f'{column}{row}')
                 try:
-                    cell = sheet.getCell(f'{column}{row}')
-                except ValueError:
-                    pass
-                else:
-                    formula = cell.getFormula()
-                    if formula is not None:
-                        try:
-                            value = cell.evalFormula(self.__filled_cells)
-                            value = evaluate(formula, self.__filled_cells)
-                        except Exception as e:
-                            print(f'Error evaluating cell {column}{row}: {formula}')
-                            print(f'{e!r}')
-                            return
-                        print(f'Evaluated cell {column}{row} with result {value} ({formula})')
-                        self.__filled_cells[f'{column}{row}'] = value
-                        cell.setValue(value, is_formula=True)
-
+                    value = evaluate(formula, self.__filled_cells)
+                except Exception as e:
+                    print(f'Error evaluating cell {column}{row}: {formula}')
+                    print(f'{e!r}')
+                    return
+                print(f'Evaluated cell {column}{row} with result {value} ({formula})')
+                self.__filled_cells[f'{column}{row}'] = value
+                cell.setValue(value, is_formula=True)
+
+            sheet_fingerprints[column] = self._fingerprint(sheet, column, header, values, formulas)
+            changed = True
             column = _incr_column(column)
 
+        if not changed:
+            print("Nothing changed in", self.args.spreadsheet)
+            return
+        shutil.copyfile(self.args.spreadsheet, self.args.spreadsheet + '.back')
         doc.save()
+        self._saveFingerprints(fingerprints)
         print("Saved", self.args.spreadsheet)
 
 
@@ -9,6 +9,23 @@ _REPLACEMENTS = [
 ]
 
 
+def references(formula_string):
+    """
+    >>> references('of:=[.K3]+SUM([.K7:.K9])')
+    ['K7', 'K8', 'K9', 'K3']
+    >>> references('of:=[.K5]-[.J5]')
+    ['K5', 'J5']
+    """
+    refs = []
+    for m in _RANGE_RE.finditer(formula_string):
+        colstart, rowstart, colend, rowend = m.groups()
+        refs.extend(f'{colstart}{row}' for row in range(int(rowstart), int(rowend) + 1))
+    for m in _CELL_RE.finditer(formula_string):
+        col, row = m.groups()
+        refs.append(f'{col}{row}')
+    return refs
+
+
 def evaluate(formula_string, celldict):
     """
     >>> celldict = {'K3': 4, 'K4': 1, 'K5': -2, 'K7': 8, 'K8': 2, 'K9': -5}
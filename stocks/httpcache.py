@@ -0,0 +1,139 @@
+import os
+from email.utils import formatdate
+from urllib.parse import urlparse
+
+from scrapy.downloadermiddlewares.httpcache import HttpCacheMiddleware
+from scrapy.extensions.httpcache import FilesystemCacheStorage, RFC2616Policy
+
+
+_TAGNIFI_PARAMS = ('company', 'statement', 'period_type', 'limit')
+# headers of a 304 response that replace the stored ones
+_REVALIDATION_HEADERS = (b'Date', b'ETag', b'Last-Modified', b'Cache-Control', b'Expires')
+
+
+def _get_cache_key(request):
+    """
+    Returns the path components identifying a tagnifi request, or None for
+    any other request. The host is part of the key, so responses of a local
+    stub never end up served in place of the real api ones.
+
+    >>> from scrapy import Request
+    >>> meta = {'company': 'AAPL', 'statement': 'income_statement', 'period_type': 'ttm', 'limit': 4}
+    >>> _get_cache_key(Request('https://viewer.tagnifi.com/api/fundamentals', meta=meta))
+    ('viewer.tagnifi.com', 'AAPL', 'income_statement-ttm-4')
+    >>> _get_cache_key(Request('http://127.0.0.1:8000/api/fundamentals', meta=meta))
+    ('127.0.0.1_8000', 'AAPL', 'income_statement-ttm-4')
+    >>> _get_cache_key(Request('https://example.com')) is None
+    True
+    """
+    meta = request.meta
+    if not all(param in meta for param in _TAGNIFI_PARAMS):
+        return None
+    host = urlparse(request.url).netloc.replace(':', '_')
+    return host, meta['company'], f"{meta['statement']}-{meta['period_type']}-{meta['limit']}"
+
+
+class TagnifiCachePolicy(RFC2616Policy):
+    """
+    RFC2616 policy that always stores tagnifi fundamentals responses. Freshness
+    comes from the response cache headers when present, otherwise from the per
+    statement TTL in TAGNIFI_HTTPCACHE_TTL. Stale entries are revalidated with
+    ETag/Last-Modified when the stored response has them.
+    """
+
+    def __init__(self, settings):
+        super().__init__(settings)
+        self.ttls = settings.getdict('TAGNIFI_HTTPCACHE_TTL')
+        self.default_ttl = settings.getint('TAGNIFI_HTTPCACHE_DEFAULT_TTL')
+
+    def _get_ttl(self, request):
+        statement = request.meta['statement']
+        period_type = request.meta['period_type']
+        return self.ttls.get(statement, {}).get(period_type, self.default_ttl)
+
+    def should_cache_response(self, response, request):
+        if _get_cache_key(request) is None or response.status != 200:
+            return super().should_cache_response(response, request)
+        return b'no-store' not in self._parse_cachecontrol(response)
+
+    def _compute_freshness_lifetime(self, response, request, now):
+        cc = self._parse_cachecontrol(response)
+        if _get_cache_key(request) is None or b'max-age' in cc or b'Expires' in response.headers:
+            return super()._compute_freshness_lifetime(response, request, now)
+        return self._get_ttl(request)
+
+
+class TagnifiCacheStorage(FilesystemCacheStorage):
+    """
+    Filesystem storage keyed on the BASE_URL parameters instead of the request
+    fingerprint, so entries are laid out as
+    <cachedir>/<spider>/<host>/<company>/<statement>-<period_type>-<limit>.
+    """
+
+    def _get_request_path(self, spider, request):
+        key = _get_cache_key(request)
+        if key is None:
+            return super()._get_request_path(spider, request)
+        return os.path.join(self.cachedir, spider.name, *key)
+
+    def store_response(self, spider, request, response):
+        # the policy computes the entry age from the Date header, so make sure it is always stored
+        if b'Date' not in response.headers:
+            headers = response.headers.copy()
+            headers[b'Date'] = formatdate(usegmt=True)
+            response = response.replace(headers=headers)
+        super().store_response(spider, request, response)
+
+
+class TagnifiCacheMiddleware(HttpCacheMiddleware):
+    """
+    HttpCacheMiddleware that stores again an entry revalidated with a 304, with the Date and
+    validators of the 304. Otherwise the stored Date never moves forward, and once its TTL is
+    over the entry would be revalidated on every crawl.
+
+    >>> import tempfile
+    >>> from scrapy.http import Request, Response
+    >>> from scrapy.utils.test import get_crawler
+    >>> from stocks.spiders.tagnifi import TagnifiSpider
+    >>> crawler = get_crawler(TagnifiSpider, {
+    ...     'HTTPCACHE_ENABLED': True,
+    ...     'HTTPCACHE_DIR': tempfile.mkdtemp(),
+    ...     'HTTPCACHE_POLICY': 'stocks.httpcache.TagnifiCachePolicy',
+    ...     'HTTPCACHE_STORAGE': 'stocks.httpcache.TagnifiCacheStorage',
+    ...     'TAGNIFI_HTTPCACHE_TTL': {},
+    ...     'TAGNIFI_HTTPCACHE_DEFAULT_TTL': 3600,
+    ... })
+    >>> spider = crawler._create_spider()
+    >>> mw = TagnifiCacheMiddleware.from_crawler(crawler)
+    >>> mw.spider_opened(spider)
+    >>> url = 'http://127.0.0.1:8000/api/fundamentals?company=AAA'
+    >>> meta = {'company': 'AAA', 'statement': 'income_statement', 'period_type': 'ttm', 'limit': 1}
+    >>> expired = Response(url, body=b'{}', headers={'ETag': '"v1"', 'Date': 'Thu, 01 Jan 2015 00:00:00 GMT'})
+    >>> mw.storage.store_response(spider, Request(url, meta=meta), expired)
+
+    The expired entry is revalidated, and the 304 makes it fresh again for the next crawls.
+
+    >>> request = Request(url, meta=meta)
+    >>> mw.process_request(request, spider) is None, request.headers.get('If-None-Match')
+    (True, b'"v1"')
+    >>> mw.process_response(request, Response(url, status=304, headers={'ETag': '"v1"'}), spider).body
+    b'{}'
+    >>> for _ in range(2):
+    ...     response = mw.process_request(Request(url, meta=meta), spider)
+    >>> response.body, response.flags
+    (b'{}', ['cached'])
+    >>> [crawler.stats.get_value(f'httpcache/{key}') for key in ('revalidate', 'refresh', 'hit')]
+    [1, 1, 2]
+    """
+
+    def process_response(self, request, response, spider):
+        cachedresponse = request.meta.get('cached_response')
+        result = super().process_response(request, response, spider)
+        if cachedresponse is not None and result is cachedresponse and response.status == 304:
+            headers = cachedresponse.headers.copy()
+            for name in _REVALIDATION_HEADERS:
+                if name in response.headers:
+                    headers[name] = response.headers[name]
+            self.storage.store_response(spider, request, cachedresponse.replace(headers=headers, flags=[]))
+            self.stats.inc_value('httpcache/refresh', spider=spider)
+        return result
@@ -5,7 +5,12 @@
 # See documentation in:
 # https://doc.scrapy.org/en/latest/topics/spider-middleware.html
 
-from scrapy import signals
+import random
+
+from twisted.internet import reactor
+from twisted.internet.task import deferLater
+from scrapy import signals, Request
+from scrapy.downloadermiddlewares.retry import RetryMiddleware
 
 
 class StocksSpiderMiddleware(object):
@@ -101,3 +106,58 @@ class StocksDownloaderMiddleware(object):
 
     def spider_opened(self, spider):
         spider.logger.info('Spider opened: %s' % spider.name)
+
+
+class BackoffRetryMiddleware(RetryMiddleware):
+    """
+    RetryMiddleware that waits an exponentially growing, jittered delay before
+    handing back the retry request, instead of rescheduling it right away.
+    """
+
+    def __init__(self, settings):
+        super().__init__(settings)
+        self.backoff_base = settings.getfloat('RETRY_BACKOFF_BASE', 30)
+        self.backoff_max = settings.getfloat('RETRY_BACKOFF_MAX', 600)
+
+    def _get_backoff(self, request, response=None):
+        """
+        Seconds to wait before sending the given retry request: between half and the full
+        RETRY_BACKOFF_BASE * 2 ** (retry_times - 1), capped to RETRY_BACKOFF_MAX, and never
+        less than the Retry-After header of the response, if any.
+
+        >>> from scrapy.http import Response
+        >>> from scrapy.settings import Settings
+        >>> mw = BackoffRetryMiddleware(Settings({'RETRY_BACKOFF_BASE': 10, 'RETRY_BACKOFF_MAX': 60}))
+        >>> random.seed(0)
+        >>> [round(mw._get_backoff(Request('http://x', meta={'retry_times': n})), 2) for n in range(1, 6)]
+        [9.22, 17.58, 28.41, 37.77, 45.34]
+        >>> all(5 <= mw._get_backoff(Request('http://x', meta={'retry_times': 1})) <= 10 for _ in range(100))
+        True
+        >>> all(30 <= mw._get_backoff(Request('http://x', meta={'retry_times': 9})) <= 60 for _ in range(100))
+        True
+        >>> throttled = Response('http://x', status=429, headers={'Retry-After': '120'})
+        >>> mw._get_backoff(Request('http://x', meta={'retry_times': 1}), throttled)
+        120.0
+        >>> throttled = Response('http://x', status=429, headers={'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'})
+        >>> 5 <= mw._get_backoff(Request('http://x', meta={'retry_times': 1}), throttled) <= 10
+        True
+        """
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (request.meta.get('retry_times', 1) - 1))
+        delay = delay / 2 + random.uniform(0, delay / 2)
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, float(retry_after))
+        return delay
+
+    def _delay(self, result, spider, response=None):
+        if not isinstance(result, Request):
+            return result
+        delay = self._get_backoff(result, response)
+        spider.logger.info(f"Retrying {result.url} in {delay:.1f} seconds")
+        return deferLater(reactor, delay, lambda: result)
+
+    def process_response(self, request, response, spider):
+        return self._delay(super().process_response(request, response, spider), spider, response)
+
+    def process_exception(self, request, exception, spider):
+        return self._delay(super().process_exception(request, exception, spider), spider)
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Cross ticker screening over the spider json outputs, without going through the spreadsheets.
+
+    python -m stocks.screen outputs/ --where "gross_margin > 0.4" --where "debt_to_equity < 1" --rank fcf_margin
+"""
+import os
+import re
+import json
+import operator
+import argparse
+
+import numpy as np
+
+from stocks.tags import TRANSLATION, DIVISORS
+
+
+_OUTPUT_RE = re.compile(r"([^-]+)-(\w+)-(\w+)-(\d+)\.json$")
+_CONDITION_RE = re.compile(r"\s*(\w+)\s*(<=|>=|==|!=|<|>)\s*(\S+)\s*$")
+_OPERATORS = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '==': operator.eq,
+    '!=': operator.ne,
+}
+
+TAGS = []
+# tags of each statement are contiguous in TAGS
+_STATEMENT_SLICES = {}
+for _statement, _translations in TRANSLATION.items():
+    _STATEMENT_SLICES[_statement] = slice(len(TAGS), len(TAGS) + len(_translations))
+    TAGS.extend(_translations)
+
+# same as TagnifiSpider.STATEMENTS
+_PERIOD_TYPES = {
+    'balance_sheet_statement': 'quarter',
+    'income_statement': 'ttm',
+    'cash_flow_statement': 'ttm',
+}
+
+# rows 47-58, 74-85 and 120-140 of the workbook
+_CURRENT_ASSETS = [tag for tag, row in TRANSLATION['balance_sheet_statement'].items() if 47 <= row <= 58]
+_CURRENT_LIABILITIES = [tag for tag, row in TRANSLATION['balance_sheet_statement'].items() if 74 <= row <= 85]
+_OPERATING_ADJUSTMENTS = [tag for tag, row in TRANSLATION['cash_flow_statement'].items() if 120 <= row <= 140]
+_EQUITY = ['preferredstock', 'commonstock', 'additionalpaidincapital', 'retainedearningsdeficit', 'treasurystock',
+           'accumulatedothercomprehensiveincome']
+_OPEX = ['costofrevenue', 'sellinggeneraladministrative', 'researchdevelopment',
+         'depreciationdepletionamortizationexpense', 'restructuringimpairmentchargesincomeopex',
+         'otheroperatingexpenses']
+
+
+def parse_condition(condition):
+    """
+    >>> parse_condition('gross_margin > 0.4')
+    ('gross_margin', '>', 0.4)
+    >>> parse_condition('debt_to_equity<=1')
+    ('debt_to_equity', '<=', 1.0)
+    """
+    m = _CONDITION_RE.match(condition)
+    if m is None:
+        raise ValueError(f"Wrong condition: {condition}")
+    name, op, value = m.groups()
+    return name, op, float(value)
+
+
+def _div(num, den):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result = num / den
+    result[~np.isfinite(result)] = np.nan
+    return result
+
+
+class Fundamentals:
+    """
+    Tagnifi fundamentals of many tickers as a (ticker x period x tag) array. Periods are fiscal
+    (year, quarter) pairs, most recent first, listed in self.periods. Values are scaled by DIVISORS
+    like in the spreadsheets. Tags missing from a loaded statement are 0 like empty cells, while
+    all the tags of a statement not loaded for a ticker and period are nan.
+    """
+
+    def __init__(self, tickers, periods, values):
+        self.tickers = np.array(tickers)
+        self.periods = periods
+        self.values = values
+        self.__tag_index = {tag: i for i, tag in enumerate(TAGS)}
+        self.__metrics = {}
+
+    @classmethod
+    def load(cls, path, period_types=None, num_periods=None):
+        """
+        Loads every spider output found in path having the period type chosen for its statement,
+        by default the ones crawled by TagnifiSpider. When several outputs exist for the same
+        company and statement, the one with the greatest limit wins. Only the num_periods most
+        recent fiscal periods are kept, all of them by default.
+
+        >>> import tempfile
+        >>> from stocks.stub import make_fundamentals
+        >>> path = tempfile.mkdtemp()
+        >>> outputs = [('AAA', 'balance_sheet_statement', 'quarter', 4), ('AAA', 'income_statement', 'ttm', 4),
+        ...            ('AAA', 'income_statement', 'annual', 8), ('AAA', 'cash_flow_statement', 'ttm', 4),
+        ...            ('BBB', 'income_statement', 'ttm', 2)]
+        >>> for company, statement, period_type, limit in outputs:
+        ...     with open(os.path.join(path, f'{company}-{statement}-{period_type}-{limit}.json'), 'w') as f:
+        ...         json.dump(make_fundamentals(company, statement, period_type, limit, 100), f)
+        >>> fundamentals = Fundamentals.load(path)
+        >>> fundamentals.periods
+        [(2020, 4), (2020, 3), (2020, 2), (2020, 1)]
+        >>> np.isnan(fundamentals.metric('fcf_margin')).tolist()
+        [[False, False, False, False], [True, True, True, True]]
+        >>> np.isnan(fundamentals.metric('gross_margin')).tolist()
+        [[False, False, False, False], [False, False, True, True]]
+        >>> np.isnan(fundamentals.metric('current_ratio')).tolist()
+        [[False, False, False, False], [True, True, True, True]]
+        >>> [ticker for ticker, _ in fundamentals.screen([('gross_margin', '>', -100)])]
+        ['AAA', 'BBB']
+        >>> [ticker for ticker, _ in fundamentals.screen([('gross_margin', '>', -100), ('fcf_margin', '>', -100)])]
+        ['AAA']
+        >>> annual = Fundamentals.load(path, dict.fromkeys(TRANSLATION, 'annual'))
+        >>> annual.tickers.tolist(), annual.periods[:3], len(annual.periods)
+        (['AAA'], [(2020, 4), (2019, 4), (2018, 4)], 8)
+        >>> Fundamentals.load(tempfile.mkdtemp()).screen()
+        Traceback (most recent call last):
+        ...
+        ValueError: No period 0, 0 periods loaded
+        """
+        period_types = dict(_PERIOD_TYPES, **(period_types or {}))
+        outputs = {}
+        for filename in os.listdir(path):
+            m = _OUTPUT_RE.match(filename)
+            if m is None:
+                continue
+            company, statement, period_type, limit = m.groups()
+            if period_types.get(statement) != period_type:
+                continue
+            key = company, statement
+            if key not in outputs or outputs[key][0] < int(limit):
+                outputs[key] = (int(limit), os.path.join(path, filename))
+
+        records = []
+        for (company, statement), (_, filename) in outputs.items():
+            period_type = period_types[statement]
+            with open(filename) as f:
+                data = json.load(f)
+            for fundamental in data['fundamentals']:
+                # unlike Process.run(), fiscal Q4 ttm entries (flagged as annual_period) are kept, otherwise
+                # the most recent period could have only balance sheet data
+                if period_type == 'annual' and not fundamental['annual_period']:
+                    continue
+                quarter = 4 if period_type == 'annual' else fundamental['fiscal_quarter']
+                records.append((company, statement, (fundamental['fiscal_year'], quarter), fundamental['tags']))
+
+        tickers = sorted({company for company, _ in outputs})
+        periods = sorted({period for _, _, period, _ in records}, reverse=True)[:num_periods]
+        ticker_index = {ticker: i for i, ticker in enumerate(tickers)}
+        period_index = {period: i for i, period in enumerate(periods)}
+        tag_index = {tag: i for i, tag in enumerate(TAGS)}
+        values = np.full((len(tickers), len(periods), len(TAGS)), np.nan)
+        for company, statement, period, tags in records:
+            if period not in period_index:
+                continue
+            cell = values[ticker_index[company], period_index[period]]
+            cell[_STATEMENT_SLICES[statement]] = 0
+            for tag in tags:
+                name = tag['tag'].lower()
+                if name in TRANSLATION[statement]:
+                    cell[tag_index[name]] = tag['value'] / DIVISORS[name]
+        return cls(tickers, periods, values)
+
+    def tag(self, name):
+        """
+        Returns the (ticker x period) values of the given tag.
+        """
+        return self.values[:, :, self.__tag_index[name]]
+
+    def _sum(self, tags):
+        return self.values[:, :, [self.__tag_index[tag] for tag in tags]].sum(axis=2)
+
+    def metric(self, name):
+        """
+        Returns the (ticker x period) values of a tag or a derived metric. Metrics that
+        would be #DIV/0! in the spreadsheet are nan.
+        """
+        if name in self.__tag_index:
+            return self.tag(name)
+        if name not in self.__metrics:
+            try:
+                compute = getattr(self, f'_metric_{name}')
+            except AttributeError:
+                raise ValueError(f"Unknown metric {name}") from None
+            self.__metrics[name] = compute()
+        return self.__metrics[name]
+
+    def _metric_gross_profit(self):
+        return self.tag('revenue') - self.tag('costofrevenue')
+
+    def _metric_operating_income(self):
+        return self.tag('revenue') - self._sum(_OPEX)
+
+    def _metric_consolidated_net_income(self):
+        return (self.tag('incomebeforeincometaxes') - self.tag('incometaxes') + self.tag('discontinuedoperations')
+                + self.tag('extraordinaryitems'))
+
+    def _metric_operating_cash_flow(self):
+        return self.metric('consolidated_net_income') + self._sum(_OPERATING_ADJUSTMENTS)
+
+    def _metric_fcf(self):
+        return self.metric('operating_cash_flow') - np.abs(self.tag('purchasepropertyplantequipment'))
+
+    def _metric_total_debt(self):
+        return self.tag('debtcurrent') + self.tag('longtermdebtcapitalleaseobligations')
+
+    def _metric_net_debt(self):
+        return self.metric('total_debt') - self.tag('cashequivalents') - self.tag('shortterminvestments')
+
+    def _metric_equity(self):
+        return self._sum(_EQUITY)
+
+    def _metric_gross_margin(self):
+        return _div(self.metric('gross_profit'), self.tag('revenue'))
+
+    def _metric_operating_margin(self):
+        return _div(self.metric('operating_income'), self.tag('revenue'))
+
+    def _metric_net_margin(self):
+        return _div(self.tag('netincomelossattributablecommonshareholders'), self.tag('revenue'))
+
+    def _metric_fcf_margin(self):
+        return _div(self.metric('fcf'), self.tag('revenue'))
+
+    def _metric_debt_to_equity(self):
+        return _div(self.metric('total_debt'), self.metric('equity'))
+
+    def _metric_net_debt_to_fcf(self):
+        return _div(self.metric('net_debt'), self.metric('fcf'))
+
+    def _metric_current_ratio(self):
+        return _div(self._sum(_CURRENT_ASSETS), self._sum(_CURRENT_LIABILITIES))
+
+    def _metric_roe(self):
+        return _div(self.tag('netincomelossattributablecommonshareholders'), self.metric('equity'))
+
+    def _metric_eps(self):
+        return _div(self.tag('netincomelossattributablecommonshareholders'), self.tag('dilutedsharesoutstanding'))
+
+    def screen(self, conditions=(), rank=None, descending=True, period=0, top=None):
+        """
+        Returns the (ticker, value) pairs matching all the (metric, operator, value) conditions
+        at the given period index, sorted by the rank metric. Tickers with a nan metric never match.
+
+        >>> values = np.full((3, 1, len(TAGS)), np.nan)
+        >>> revenue, cost = TAGS.index('revenue'), TAGS.index('costofrevenue')
+        >>> values[0, 0, [revenue, cost]] = 10, 4
+        >>> values[1, 0, [revenue, cost]] = 10, 8
+        >>> fundamentals = Fundamentals(['AAA', 'BBB', 'CCC'], [(2020, 3)], values)
+        >>> fundamentals.screen([('gross_margin', '>', 0.1)], rank='gross_margin')
+        [('AAA', 0.6), ('BBB', 0.2)]
+        >>> fundamentals.screen([('gross_margin', '!=', 0.6)])
+        [('BBB', nan)]
+        >>> fundamentals.screen(rank='gross_margin', descending=False, top=1)
+        [('BBB', 0.2)]
+        >>> fundamentals.screen(period=1)
+        Traceback (most recent call last):
+        ...
+        ValueError: No period 1, 1 periods loaded
+        """
+        if not 0 <= period < len(self.periods):
+            raise ValueError(f"No period {period}, {len(self.periods)} periods loaded")
+        mask = np.ones(len(self.tickers), dtype=bool)
+        for name, op, value in conditions:
+            metric = self.metric(name)[:, period]
+            mask &= ~np.isnan(metric) & _OPERATORS[op](metric, value)
+        indexes = np.flatnonzero(mask)
+        if rank is None:
+            values = np.full(len(indexes), np.nan)
+        else:
+            values = self.metric(rank)[indexes, period]
+            order = np.argsort(-values if descending else values, kind='stable')
+            order = order[~np.isnan(values[order])]
+            indexes, values = indexes[order], values[order]
+        if top is not None:
+            indexes, values = indexes[:top], values[:top]
+        return list(zip(self.tickers[indexes].tolist(), values.tolist()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Screen tickers over the spider outputs.')
+    parser.add_argument('path', help='Directory with the spider json outputs.')
+    parser.add_argument('--where', action='append', default=[], help='Condition, i.e. "gross_margin > 0.4".')
+    parser.add_argument('--rank', help='Metric to sort by.')
+    parser.add_argument('--ascending', action='store_true', help='Sort in ascending order.')
+    parser.add_argument('--period-type', choices=['quarter', 'ttm', 'annual'],
+                        help='Load this period type for every statement, instead of the crawled defaults.')
+    parser.add_argument('--period', type=int, default=0, help='Period to screen, 0 is the most recent.')
+    parser.add_argument('--top', type=int, help='Show only the first results.')
+    args = parser.parse_args()
+
+    period_types = dict.fromkeys(TRANSLATION, args.period_type) if args.period_type else None
+    fundamentals = Fundamentals.load(args.path, period_types)
+    conditions = [parse_condition(condition) for condition in args.where]
+    for ticker, value in fundamentals.screen(conditions, args.rank, not args.ascending, args.period, args.top):
+        print(f"{ticker}\t{value}")
+
+
+if __name__ == '__main__':
+    main()
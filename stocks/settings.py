@@ -52,9 +52,24 @@ DOWNLOAD_DELAY = 20
 
 # Enable or disable downloader middlewares
 # See https://doc.scrapy.org/en/latest/topics/downloader-middleware.html
-#DOWNLOADER_MIDDLEWARES = {
+DOWNLOADER_MIDDLEWARES = {
 #    'stocks.middlewares.StocksDownloaderMiddleware': 543,
-#}
+    'scrapy.downloadermiddlewares.retry.RetryMiddleware': None,
+    'stocks.middlewares.BackoffRetryMiddleware': 550,
+    'scrapy.downloadermiddlewares.httpcache.HttpCacheMiddleware': None,
+    'stocks.httpcache.TagnifiCacheMiddleware': 900,
+}
+
+# Retries wait RETRY_BACKOFF_BASE * 2 ** (attempt - 1) seconds (capped to RETRY_BACKOFF_MAX),
+# jittered to between half and the full value
+RETRY_TIMES = 5
+RETRY_HTTP_CODES = [500, 502, 503, 504, 522, 524, 408, 429]
+RETRY_BACKOFF_BASE = 30
+RETRY_BACKOFF_MAX = 600
+
+# Completed (company, statement, period_type, limit) requests are recorded here so an interrupted crawl
+# resumes where it stopped. The file is removed once a crawl completes all its requests.
+TAGNIFI_CHECKPOINT_FILE = 'tagnifi.checkpoint'
 
 # Enable or disable extensions
 # See https://doc.scrapy.org/en/latest/topics/extensions.html
@@ -83,8 +98,18 @@ DOWNLOAD_DELAY = 20
 
 # Enable and configure HTTP caching (disabled by default)
 # See https://doc.scrapy.org/en/latest/topics/downloader-middleware.html#httpcache-middleware-settings
-#HTTPCACHE_ENABLED = True
-#HTTPCACHE_EXPIRATION_SECS = 0
-#HTTPCACHE_DIR = 'httpcache'
-#HTTPCACHE_IGNORE_HTTP_CODES = []
-#HTTPCACHE_STORAGE = 'scrapy.extensions.httpcache.FilesystemCacheStorage'
+# Cached hits are answered by the middleware before reaching the downloader, so they skip DOWNLOAD_DELAY
+HTTPCACHE_ENABLED = True
+HTTPCACHE_EXPIRATION_SECS = 0
+HTTPCACHE_DIR = 'httpcache'
+HTTPCACHE_IGNORE_HTTP_CODES = []
+HTTPCACHE_POLICY = 'stocks.httpcache.TagnifiCachePolicy'
+HTTPCACHE_STORAGE = 'stocks.httpcache.TagnifiCacheStorage'
+
+# Freshness (in seconds) of tagnifi responses without cache headers, per statement and period type
+TAGNIFI_HTTPCACHE_TTL = {
+    'balance_sheet_statement': {'quarter': 7 * 86400, 'annual': 30 * 86400},
+    'income_statement': {'quarter': 7 * 86400, 'ttm': 7 * 86400, 'annual': 30 * 86400},
+    'cash_flow_statement': {'quarter': 7 * 86400, 'ttm': 7 * 86400, 'annual': 30 * 86400},
+}
+TAGNIFI_HTTPCACHE_DEFAULT_TTL = 86400
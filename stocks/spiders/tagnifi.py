@@ -1,4 +1,7 @@
-from scrapy import Spider, Request
+import os
+from urllib.parse import urlparse
+
+from scrapy import signals, Spider, Request
 from scrapy.exceptions import NotConfigured
 
 
@@ -8,7 +11,7 @@ AVL_PERIODS = {'quarter', 'ttm', 'annual'}
 class TagnifiSpider(Spider):
     
     name = "tagnifi"
-    BASE_URL = ('https://viewer.tagnifi.com/api/fundamentals?company={company}&statement={statement}'
+    BASE_URL = ('{api_url}/api/fundamentals?company={company}&statement={statement}'
                '&period_type={period_type}&relative_period=0&limit={limit}&industry_template=commercial')
     STATEMENTS = [('balance_sheet_statement', 'quarter'),
                   ('income_statement', 'ttm'),
@@ -17,7 +20,9 @@ class TagnifiSpider(Spider):
     
     companies = None  # comma separated list of companies ticks
     limit = 1
+    api_url = 'https://viewer.tagnifi.com'  # override to crawl a local stub (see stocks/stub.py)
     period_type = None
+    _expected = None  # checkpoint keys of every request of the crawl, set by start_requests()
 
     # be friendly!
     custom_settings = {
@@ -25,14 +30,99 @@ class TagnifiSpider(Spider):
         "DOWNLOAD_DELAY": 20,
     }
 
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        crawler.signals.connect(spider.spider_closed, signal=signals.spider_closed)
+        return spider
+
+    def spider_closed(self, spider, reason):
+        # the checkpoint only serves to resume an interrupted crawl, so once every request of this crawl
+        # completed it goes away and the next crawl fetches everything again. A crawl that gave up on
+        # some requests keeps it, so the next one resumes with the missing ones.
+        checkpoint = self.settings.get('TAGNIFI_CHECKPOINT_FILE')
+        if reason != 'finished' or not checkpoint or not os.path.exists(checkpoint):
+            return
+        if self._expected is not None and self._expected <= self._load_checkpoint():
+            os.remove(checkpoint)
+
+    @staticmethod
+    def _get_output_name(company, statement, period_type, limit):
+        return f"{company}-{statement}-{period_type}-{limit}"
+
+    def _get_checkpoint_key(self, name):
+        # keyed by host too, so a crawl against a local stub never marks real outputs as completed
+        return f"{urlparse(self.api_url).netloc}/{name}"
+
+    def _load_checkpoint(self):
+        checkpoint = self.settings.get('TAGNIFI_CHECKPOINT_FILE')
+        if not checkpoint or not os.path.exists(checkpoint):
+            return set()
+        with open(checkpoint) as f:
+            return {line.strip() for line in f if line.strip()}
+
+    def _save_checkpoint(self, name):
+        checkpoint = self.settings.get('TAGNIFI_CHECKPOINT_FILE')
+        if checkpoint:
+            with open(checkpoint, "a") as f:
+                f.write(self._get_checkpoint_key(name) + "\n")
+
     def start_requests(self):
+        """
+        Requests completed in an interrupted crawl (checkpointed and with their output present) are skipped.
+
+        >>> import tempfile
+        >>> from scrapy.settings import Settings
+        >>> cwd = os.getcwd()
+        >>> os.chdir(tempfile.mkdtemp())
+        >>> spider = TagnifiSpider(companies='AAPL,MSFT')
+        >>> spider.settings = Settings({'TAGNIFI_CHECKPOINT_FILE': 'tagnifi.checkpoint'})
+        >>> len(list(spider.start_requests()))
+        6
+        >>> for name in ('AAPL-income_statement-ttm-1', 'MSFT-income_statement-ttm-1'):
+        ...     spider._save_checkpoint(name)
+        >>> _ = open('AAPL-income_statement-ttm-1.json', 'w').write('{}')
+        >>> [f"{r.meta['company']}-{r.meta['statement']}" for r in spider.start_requests()]
+        ['AAPL-balance_sheet_statement', 'MSFT-balance_sheet_statement', 'MSFT-income_statement', \
+'AAPL-cash_flow_statement', 'MSFT-cash_flow_statement']
+        >>> stub = TagnifiSpider(companies='AAPL,MSFT', api_url='http://127.0.0.1:8000')
+        >>> stub.settings = spider.settings
+        >>> len(list(stub.start_requests()))
+        6
+        >>> open('tagnifi.checkpoint').read().split()
+        ['viewer.tagnifi.com/AAPL-income_statement-ttm-1', 'viewer.tagnifi.com/MSFT-income_statement-ttm-1']
+
+        The checkpoint is removed only once a crawl finished with every request completed.
+
+        >>> spider.spider_closed(spider, 'shutdown')
+        >>> os.path.exists('tagnifi.checkpoint')
+        True
+        >>> spider.spider_closed(spider, 'finished')
+        >>> os.path.exists('tagnifi.checkpoint')
+        True
+        >>> for request in spider.start_requests():
+        ...     meta = request.meta
+        ...     name = spider._get_output_name(meta['company'], meta['statement'], meta['period_type'], meta['limit'])
+        ...     spider._save_checkpoint(name)
+        >>> spider.spider_closed(spider, 'finished')
+        >>> os.path.exists('tagnifi.checkpoint')
+        False
+        >>> os.chdir(cwd)
+        """
         if not self.companies:
             raise NotConfigured
+        completed = self._load_checkpoint()
+        self._expected = set()
         for statement, period_type in self.STATEMENTS:
             period_type = self.period_type or period_type
             for company in self.companies.split(','):
-                yield Request(url=self.BASE_URL.format(company=company, statement=statement, period_type=period_type,
-                                                       limit=self.limit),
+                name = self._get_output_name(company, statement, period_type, self.limit)
+                self._expected.add(self._get_checkpoint_key(name))
+                if self._get_checkpoint_key(name) in completed and os.path.exists(f"{name}.json"):
+                    self.logger.info(f"Skipping {name}, already completed")
+                    continue
+                yield Request(url=self.BASE_URL.format(api_url=self.api_url, company=company, statement=statement,
+                                                       period_type=period_type, limit=self.limit),
                               meta={'statement': statement, 'period_type': period_type, 'limit': self.limit,
                                     'company': company})
     
@@ -41,4 +131,9 @@ class TagnifiSpider(Spider):
         period_type = response.meta['period_type']
         limit = response.meta['limit']
         company = response.meta['company']
-        open(f"{company}-{statement}-{period_type}-{limit}.json", "w").write(response.text)
+        name = self._get_output_name(company, statement, period_type, limit)
+        # write to a temporary file first, so an interrupted crawl never leaves a truncated output behind
+        with open(f"{name}.json.tmp", "w") as f:
+            f.write(response.text)
+        os.replace(f"{name}.json.tmp", f"{name}.json")
+        self._save_checkpoint(name)
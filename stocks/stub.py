@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the tagnifi fundamentals API, for exercising the spider offline.
+
+    python -m stocks.stub --port 8000 --latency 0.2 --error-rate 0.05 --throttle-rate 0.05
+    scrapy crawl tagnifi -a companies=STUB1,STUB2 -a api_url=http://127.0.0.1:8000 -s DOWNLOAD_DELAY=0
+
+The http cache and the crawl checkpoint are keyed by host, so stub responses are kept apart
+from the real ones. The spider outputs are not: they are written to the current directory as
+<company>-<statement>-<period_type>-<limit>.json, hence the made up tickers above.
+"""
+import json
+import time
+import random
+import hashlib
+import argparse
+from email.utils import formatdate
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from stocks.tags import TRANSLATION
+
+
+def make_fundamentals(company, statement, period_type, limit, num_tags):
+    """
+    Builds a tagnifi shaped payload, using the statement tags known to the spreadsheets first.
+    Values are derived from the request parameters, so the same query always gets the same body.
+
+    >>> data = make_fundamentals('AAPL', 'income_statement', 'ttm', 2, 3)
+    >>> len(data['fundamentals']), len(data['fundamentals'][0]['tags'])
+    (2, 3)
+    >>> data['fundamentals'][0]['tags'][0]['tag']
+    'revenue'
+    >>> data == make_fundamentals('AAPL', 'income_statement', 'ttm', 2, 3)
+    True
+    """
+    rnd = random.Random(f'{company}-{statement}-{period_type}')
+    names = list(TRANSLATION.get(statement, {}))[:num_tags]
+    names += [f'{statement}tag{i}' for i in range(num_tags - len(names))]
+    fundamentals = []
+    year, quarter = 2020, 4
+    for _ in range(limit):
+        fundamentals.append({
+            'company': company,
+            'statement': statement,
+            'annual_period': period_type == 'annual' or quarter == 4,
+            'fiscal_year': year,
+            'fiscal_quarter': quarter,
+            'end_period': f'{year}-{quarter * 3:02d}-30',
+            'tags': [{'tag': name, 'value': rnd.randint(-10 ** 9, 10 ** 10)} for name in names],
+        })
+        if period_type == 'annual':
+            year -= 1
+        else:
+            quarter -= 1
+            if not quarter:
+                year, quarter = year - 1, 4
+    return {'fundamentals': fundamentals}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+
+    # overridden by make_server()
+    latency = 0.0
+    error_rate = 0.0
+    throttle_rate = 0.0
+    num_tags = 50
+    last_modified = formatdate(usegmt=True)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != '/api/fundamentals':
+            self.send_error(404)
+            return
+        if self.latency:
+            time.sleep(random.expovariate(1 / self.latency))
+        draw = random.random()
+        if draw < self.throttle_rate:
+            self.send_response(429)
+            self.send_header('Retry-After', '1')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if draw < self.throttle_rate + self.error_rate:
+            self.send_error(503)
+            return
+
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        try:
+            data = make_fundamentals(params['company'], params['statement'], params['period_type'],
+                                     int(params.get('limit', 1)), self.num_tags)
+        except (KeyError, ValueError):
+            self.send_error(400)
+            return
+        body = json.dumps(data).encode()
+        etag = '"{}"'.format(hashlib.sha1(body).hexdigest())
+        if self.headers.get('If-None-Match') == etag or self.headers.get('If-Modified-Since') == self.last_modified:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', self.last_modified)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(host='127.0.0.1', port=0, latency=0.0, error_rate=0.0, throttle_rate=0.0, num_tags=50):
+    """
+    Returns a ThreadingHTTPServer serving the stub api. With port 0 a free port is picked,
+    available afterwards as server.server_port.
+    """
+    handler = type('StubHandler', (StubHandler,), {
+        'latency': latency,
+        'error_rate': error_rate,
+        'throttle_rate': throttle_rate,
+        'num_tags': num_tags,
+    })
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve tagnifi shaped fundamentals locally.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.0, help='Mean response latency in seconds.')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with 503.')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Fraction of requests answered with 429.')
+    parser.add_argument('--tags', type=int, default=50, help='Number of tags per period (payload size).')
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.latency, args.error_rate, args.throttle_rate, args.tags)
+    print(f"Serving on http://{args.host}:{server.server_port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
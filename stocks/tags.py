@@ -0,0 +1,119 @@
+from collections import defaultdict
+
+
+# spreadsheet row of each tagnifi tag, per statement
+TRANSLATION = {
+    'income_statement': {
+        'revenue': 3,
+        'costofrevenue': 7,
+        'sellinggeneraladministrative': 10,
+        'researchdevelopment': 11,
+        'depreciationdepletionamortizationexpense': 12,
+        'restructuringimpairmentchargesincomeopex': 13,
+        'otheroperatingexpenses': 16,
+        'interestexpense': 21,
+        'otherexpenseincome': 23,
+        'incomebeforeincometaxes': 24,
+        'incometaxes': 26,
+        # 'consolidatednetincomeloss': 27, to be computed
+        'noncontrollinginterestincome': 29,
+        'discontinuedoperations': 34,
+        'extraordinaryitems': 35,
+        'preferredstockdividendsdeclared': 38,
+        'netincomelossattributablecommonshareholders': 39,
+        'dilutedsharesoutstanding': 41,
+        'commonstockdividendsdeclared': 42,
+    },
+    'balance_sheet_statement': {
+        'cashequivalents': 47,
+        'shortterminvestments': 48,
+        'tradereceivables': 51,
+        'financingreceivables': 52,
+        'otherreceivables': 53,
+        'inventories': 55,
+        'prepaidexpensesothercurrentassets': 56,
+        'divestmentassetscurrent': 57,
+        'deferredtaxassetscurrent': 58,
+        'propertyplantequipment': 62,
+        'propertyplantequipmentnet': 64,
+        'goodwill': 65,
+        'intangibleassetsnet': 66,
+        'longterminvestments': 67,
+        'divestmentassetsnoncurrent': 68,
+        'deferredtaxassetsnoncurrent': 69,
+        'receivablesnoncurrent': 70,
+        'otherassets': 71,
+        'accountspayable': 74,
+        'accruedothercurrentliabilities': 77,
+        'debtcurrent': 79,
+        'taxespayablecurrent': 80,
+        'deferredliabilitiescurrent': 81,
+        'customeradvancesdepositscurrent': 82,
+        'divestmentliabilitiescurrent': 83,
+        'dividendspayable': 84,
+        'employeerelatedliabilitiescurrent': 85,
+        'longtermdebtcapitalleaseobligations': 90,
+        'deferredtaxesnoncurrent': 93,
+        'taxespayablenoncurrent': 94,
+        'divestmentliabilitiesnoncurrent': 95,
+        'noncontrollinginterest': 96,
+        'pensionotherpostretirementliabilities': 97,
+        'employeerelatedliabilitiesnoncurrent': 98,
+        'othernoncurrentliabilities': 99,
+        'preferredstock': 103,
+        'commonstock': 104,
+        'additionalpaidincapital': 105,
+        'retainedearningsdeficit': 106,
+        'treasurystock': 107,
+        'accumulatedothercomprehensiveincome': 108,
+        'commonstockclassasharesoutstanding': 114,
+    },
+    'cash_flow_statement': {
+        'depreciationdepletionamortization': 120,
+        'deferredincometaxestaxcredits': 121,
+        'sharebasedcompensation': 122,
+        'changedeferredrevenue': 123,
+        'gainlossonsale': 124,
+        'unrealizedgainloss': 125,
+        'pensionotherpostretirementbenefits': 126,
+        'changetaxespayable': 128,
+        'changeinventories': 129,
+        'changetradereceivables': 130,
+        'changeaccountspayable': 131,
+        'changeotheroperatingassetsliabilitiesnet': 132,
+        'restructuringimpairmentchargescashflow': 134,
+        'changecustomeradvancesdeposits': 135,
+        'provisiondoubtfulaccounts': 136,
+        'changefinancingreceivables': 137,
+        'changeotherreceivables': 138,
+        'extraordinaryitemscashflow': 139,
+        'otheroperatingactivities': 140,
+        'acquisitionsnet': 144,
+        'purchasepropertyplantequipment': 145,
+        'salepropertyplantequipment': 146,
+        'purchaseinvestments': 148,
+        'intangiblesnet': 149,
+        'salematurityinvestments': 150,
+        'otherinvestingactivities': 151,
+        'proceedsincentiveplans': 156,
+        'cashdividends': 157,
+        'dividendsnoncontrollinginterests': 158,
+        'noncontrollinginterestsfinancing': 159,
+        'equityissuances': 161,
+        'equityrepurchases': 162,
+        'longtermdebtrepayments': 164,
+        'longtermdebtissuances': 165,
+        'shorttermdebtissuancesrepayments': 167,
+        'otherfinancingactivities': 168,
+        'effectcurrencyexchangerate': 171,
+        'cashpaidincometaxes': 173,
+        'cashpaidinterest': 174,
+    },
+}
+
+
+DIVISORS = defaultdict(lambda: 1000000.0)
+DIVISORS.update({
+    'commonstockdividendsdeclared': 1.0,
+    'preferredstockdividendsdeclared': 1.0,
+})